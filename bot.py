@@ -1,9 +1,14 @@
-import os, json, logging, re, pathlib, numpy as np
+import os, json, time, logging, re, pathlib, asyncio, numpy as np
+from collections import Counter
 from dotenv import load_dotenv
 from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, ContextTypes, filters
 from telegram import Update
 import faiss
 from fastembed import TextEmbedding
+from vector_store import load_embeddings, rescore
+from serving import SingleFlight, RateLimiter, normalize_query
+from term_index import TermIndex, TERMS_PATH, STOP_WORDS, tokens
+from index_manifest import read_manifest, check_manifest, file_sha256, query_prefix_for
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("bot")
@@ -18,40 +23,91 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN","")
 # MODEL_NAME from .env
 MODEL_NAME = os.getenv("EMBED_MODEL","sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+# Адрес Bot API: для нагрузочных тестов — локальная заглушка (loadtest.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL","https://api.telegram.org").rstrip("/")
+# Журнал вопросов (jsonl: ts, q) — пусто, чтобы не писать; его можно проиграть через loadtest.py
+QUERY_LOG = os.getenv("QUERY_LOG","")
+# Отвечать цитатой вопроса; включает loadtest.py, чтобы сопоставлять ответы с вопросами по message_id
+QUOTE_REPLIES = os.getenv("QUOTE_REPLIES","0") == "1"
+query_log = logging.getLogger("bot.queries")
+if QUERY_LOG:
+    # файл открывается один раз; запись из обработчиков — через блокировку logging, без open() на каждый вопрос
+    _handler = logging.FileHandler(QUERY_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    query_log.addHandler(_handler)
+    query_log.setLevel(logging.INFO)
+query_log.propagate = False
 if not BOT_TOKEN or ":" not in BOT_TOKEN:
     raise RuntimeError("❌ BOT_TOKEN не найден/некорректен")
 
-# Префиксы нужны только для E5
-def is_e5(model: str) -> bool:
-    return "e5" in (model or "").lower()
+QUERY_PREFIX = query_prefix_for(MODEL_NAME)
 
 # Загрузка корпуса
 chunks = [json.loads(l) for l in CHUNKS_PATH.read_text("utf-8").splitlines()]
-X = np.load(EMB_PATH)
+X = load_embeddings(EMB_PATH)  # mmap, в RAM целиком не читается
 index = faiss.read_index(str(INDEX_PATH))
 if index.ntotal != X.shape[0] or len(chunks) != X.shape[0]:
     raise RuntimeError("❌ Размеры индекса/эмбеддингов/текстов не совпадают")
 
+CORPUS_HASH = file_sha256(CHUNKS_PATH)
+
+# Индекс должен быть собран той же моделью, библиотекой (бот кодирует запросы через fastembed)
+# и с той же схемой префиксов, что и запросы
+manifest = read_manifest()
+if manifest is None:
+    log.warning("Нет storage/manifest.json — совместимость модели и индекса не проверена, пересоберите индекс")
+else:
+    problems = check_manifest(
+        manifest,
+        model=MODEL_NAME,
+        embedder="fastembed",
+        query_prefix=QUERY_PREFIX,
+        normalization="l2",
+        dim=index.d,
+        rows=index.ntotal,
+        corpus_hash=CORPUS_HASH,
+    )
+    if problems:
+        raise RuntimeError("❌ Индекс несовместим с ботом:\n  " + "\n  ".join(problems))
+    log.info("Индекс: %s, dim=%d, собран %s", manifest["model"], manifest["dim"], manifest["built_at"])
+
 embedder = TextEmbedding(model_name=MODEL_NAME)
 
 def embed_query(q: str):
-    q = q.strip()
-    if is_e5(MODEL_NAME):
-        q = "query: " + q
+    q = QUERY_PREFIX + q.strip()
     v = np.asarray(list(embedder.embed([q]))[0], dtype="float32")
     n = np.linalg.norm(v) + 1e-12
     return (v / n).astype("float32").reshape(1, -1)
 
-def keyword_score(text: str, q_tokens: list[str]) -> float:
-    t = text.lower()
-    return sum(t.count(tok) for tok in q_tokens)
+# Для квантованного индекса (float16/int8) пересчитываем сходство топ-кандидатов по float32
+RESCORE = os.getenv("RESCORE", "1") == "1" and not isinstance(index, faiss.IndexFlat)
+
+if embed_query("проверка").shape[1] != index.d:
+    raise RuntimeError(f"❌ Модель {MODEL_NAME} даёт векторы другой размерности, чем индекс (dim={index.d})")
+
+# Словарь корпуса для исправления опечаток и словоформ в запросе
+terms = TermIndex.load() if TERMS_PATH.exists() else None
+if terms is None or terms.corpus_hash != CORPUS_HASH:
+    terms = TermIndex.build((c.get("text","") + " " + c.get("title","") for c in chunks), CORPUS_HASH)
+
+# Слова каждого фрагмента (текст, заголовок) — ключевые слова сравниваем целыми словами
+chunk_words = [(Counter(tokens(c.get("text",""))), Counter(tokens(c.get("title","")))) for c in chunks]
+
+def query_terms(q: str) -> list[list[str]]:
+    # для каждого значимого слова запроса — его варианты из корпуса; «как», «что» и т.п. не считаем
+    return [terms.expand(w) for w in tokens(q) if w not in STOP_WORDS]
 
-def best_hit(q: str):
-    q_tokens = [w for w in re.findall(r"\w+", q.lower()) if len(w) >= 3]
+def keyword_score(words: Counter, q_terms: list[list[str]]) -> float:
+    return sum(sum(words[v] for v in variants) for variants in q_terms)
+
+def best_hit(q: str, q_terms: list[list[str]]):
     v = embed_query(q)
     D, I = index.search(v, 15)  # расширим кандидатов
     if I.size == 0 or I[0,0] < 0:
         return None
+    if RESCORE:
+        ids, sims = rescore(X, v, I[0])
+        D, I = sims.reshape(1, -1), ids.reshape(1, -1)
     candidates = []
     for rank in range(I.shape[1]):
         idx = int(I[0,rank])
@@ -59,7 +115,8 @@ def best_hit(q: str):
             continue
         h = chunks[idx].copy()
         sim = float(D[0,rank])
-        kw = keyword_score(h.get("text",""), q_tokens) + 0.5*keyword_score(h.get("title",""), q_tokens)
+        text_words, title_words = chunk_words[idx]
+        kw = keyword_score(text_words, q_terms) + 0.5*keyword_score(title_words, q_terms)
         # комбинированный скор: вектор + ключевые слова
         score = 0.82*sim + 0.18*(1.0 if kw>0 else 0.0) + min(kw,5)*0.01
         candidates.append((score, sim, kw, h))
@@ -70,17 +127,17 @@ def best_hit(q: str):
             return h
     return candidates[0][3] if candidates else None
 
-def make_snippet(text: str, q: str, max_len=500) -> str:
+def make_snippet(text: str, q_terms: list[list[str]], max_len=500) -> str:
     t = re.sub(r"\s+", " ", text).strip()
     if not t:
         return ""
     # постараемся вырезать вокруг первого совпадения любого слова из запроса
-    q_tokens = [w for w in re.findall(r"\w+", q.lower()) if len(w)>=3]
     pos = -1
-    low = t.lower()
-    for tok in q_tokens:
-        pos = low.find(tok)
-        if pos != -1:
+    low = t.lower().replace("ё", "е")
+    for tok in (v for variants in q_terms for v in variants):
+        m = re.search(rf"\b{re.escape(tok)}\b", low)
+        if m:
+            pos = m.start()
             break
     if pos == -1:
         return t[:max_len]
@@ -88,14 +145,28 @@ def make_snippet(text: str, q: str, max_len=500) -> str:
     end = min(len(t), start + max_len)
     return t[start:end]
 
-def format_reply(hit: dict, q: str) -> str:
-    snippet = make_snippet(hit.get("text",""), q)
+def format_reply(hit: dict, q_terms: list[list[str]]) -> str:
+    snippet = make_snippet(hit.get("text",""), q_terms)
     title = hit.get("title","Документ")
+    section = " › ".join(hit.get("section") or [])
+    if section and section.strip() != title.strip():
+        title = f"{title} — {section}"
     url = hit.get("url","")
     if url:
         return f"{snippet}\n\nПодробнее: {title}\n{url}"
     return snippet
 
+def answer(q: str):
+    # варианты слов запроса считаем один раз: и для ранжирования, и для сниппета
+    q_terms = query_terms(q)
+    hit = best_hit(q, q_terms)
+    return format_reply(hit, q_terms) if hit else None
+
+# Одинаковые вопросы в полёте считаются один раз; каждому чату — не больше RATE_LIMIT_PER_MIN в минуту
+stats = Counter()
+flight = SingleFlight(stats)
+limiter = RateLimiter(stats, rate=float(os.getenv("RATE_LIMIT_PER_MIN", "12"))/60, burst=int(os.getenv("RATE_LIMIT_BURST", "5")))
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("✅ Бот готов. Спросите: «Чек-лист открытия», «Дресс-код бариста», «График уборки» …")
 
@@ -103,19 +174,41 @@ async def handle_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = (update.message.text or "").strip()
     if not q:
         return
+    stats["questions"] += 1
+    if QUERY_LOG:
+        query_log.info(json.dumps({"ts": round(time.time(), 3), "q": q}, ensure_ascii=False))
+    verdict = limiter.check(update.effective_chat.id)
+    if verdict != "ok":
+        if verdict == "throttle":
+            await update.message.reply_text(
+                "Слишком много вопросов подряд 🙏 Подождите немного и спросите снова.", do_quote=QUOTE_REPLIES)
+        return
     try:
-        hit = best_hit(q)
-        if not hit:
-            await update.message.reply_text("Пока не нашёл ответ. Уточните запрос.")
+        # поиск — в отдельном потоке, чтобы не блокировать цикл событий
+        reply = await flight.do(normalize_query(q), lambda: asyncio.to_thread(answer, q))
+        if not reply:
+            await update.message.reply_text("Пока не нашёл ответ. Уточните запрос.", do_quote=QUOTE_REPLIES)
             return
-        await update.message.reply_text(format_reply(hit, q))
+        await update.message.reply_text(reply, do_quote=QUOTE_REPLIES)
     except Exception as e:
         log.exception("Ошибка:", exc_info=e)
-        await update.message.reply_text("Произошла ошибка. Попробуйте ещё раз.")
+        await update.message.reply_text("Произошла ошибка. Попробуйте ещё раз.", do_quote=QUOTE_REPLIES)
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    q = stats["questions"] or 1
+    await update.message.reply_text(
+        f"Вопросов: {stats['questions']}\n"
+        f"Поисков: {stats['computed']}\n"
+        f"Склеено с одинаковыми: {stats['coalesced']} ({stats['coalesced']/q:.0%})\n"
+        f"Ограничено по частоте: {stats['throttled']} ({stats['throttled']/q:.0%})"
+    )
 
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = (ApplicationBuilder().token(BOT_TOKEN)
+           .base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(f"{TELEGRAM_API_URL}/file/bot")
+           .concurrent_updates(True).build())
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("stats", show_stats))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_question))
     print("🤖 Бот запущен. Жду сообщения в Telegram...")
     app.run_polling()
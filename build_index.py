@@ -1,10 +1,14 @@
-import os, json, pathlib, pickle, logging
+import os, sys, json, time, pathlib, pickle, logging
 from typing import List, Dict
 import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
 from dotenv import load_dotenv
-from text_utils import split_into_chunks
+from text_utils import chunk_markdown
+from dedup import dedup_records, describe, embedding_time_saved, DEDUP, REPORT_PATH
+from vector_store import EMBED_DTYPE, build_faiss_index, faiss_type_for
+from term_index import TermIndex
+from index_manifest import make_manifest, write_manifest, is_up_to_date, file_sha256, write_chunker_params, read_chunker_params
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -29,32 +33,59 @@ def build_chunks():
     records: List[Dict] = []
     for fid, info in meta.items():
         text = pathlib.Path(info["path"]).read_text("utf-8")
-        chunks = split_into_chunks(text, CHUNK_SIZE, CHUNK_OVERLAP)
+        chunks = chunk_markdown(text, CHUNK_SIZE, CHUNK_OVERLAP)
         for i, ch in enumerate(chunks):
             records.append({
                 "doc_id": fid,
                 "chunk_id": f"{fid}:{i}",
-                "text": ch,
+                "text": ch["text"],
+                "section": ch["section"],
                 "title": info["title"],
                 "url": info["url"],
             })
+    records = dedup_records(records)
+    if DEDUP:
+        log.info(describe(json.loads(REPORT_PATH.read_text("utf-8"))))
     (STORAGE/"chunks.jsonl").write_text(
         "\n".join(json.dumps(r, ensure_ascii=False) for r in records), "utf-8"
     )
+    write_chunker_params({"name": "markdown", "size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP})
     log.info("Сформировано фрагментов: %d", len(records))
 
+PASSAGE_PREFIX = "query: "
+
 def build_embeddings():
+    build = {
+        "model": MODEL_NAME,
+        "embedder": "sentence-transformers",
+        "query_prefix": "query: ",
+        "passage_prefix": PASSAGE_PREFIX,
+        "normalization": "l2",
+        "dtype": EMBED_DTYPE,
+        "faiss_type": faiss_type_for(EMBED_DTYPE),
+        "chunker": read_chunker_params(),
+        "corpus_hash": file_sha256(STORAGE/"chunks.jsonl"),
+    }
+    if "--force" not in sys.argv and is_up_to_date(build, [STORAGE/"embeddings.npy", STORAGE/"index.faiss"]):
+        log.info("Индекс актуален (manifest.json совпадает) — пересборка не нужна. Для принудительной: --force")
+        return
     model = SentenceTransformer(MODEL_NAME)
     recs = [json.loads(l) for l in (STORAGE/"chunks.jsonl").read_text("utf-8").splitlines()]
-    texts = ["query: "+r["text"] for r in recs]
+    texts = [PASSAGE_PREFIX+r["text"] for r in recs]
+    t0 = time.perf_counter()
     X = model.encode(texts, batch_size=32, normalize_embeddings=True, show_progress_bar=True)
-    np.save(STORAGE/"embeddings.npy", X)
-    index = faiss.IndexFlatIP(X.shape[1])
-    index.add(X.astype("float32"))
+    saved = embedding_time_saved(time.perf_counter() - t0)
+    if saved:
+        log.info(saved)
+    # полная точность остаётся на диске — бот читает оттуда только строки топ-кандидатов
+    np.save(STORAGE/"embeddings.npy", X.astype("float32"))
+    index = build_faiss_index(X)
     faiss.write_index(index, str(STORAGE/"index.faiss"))
     # простой резерв — сохраним тексты
     with open(STORAGE/"bm25.pkl", "wb") as f:
         pickle.dump([r["text"] for r in recs], f)
+    TermIndex.build([r["text"] + " " + r.get("title", "") for r in recs], build["corpus_hash"]).save()
+    write_manifest(make_manifest(dim=X.shape[1], rows=X.shape[0], **build))
     log.info("Готово: эмбеддинги и индекс")
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+import sys, time, random, asyncio
+from collections import Counter
+from serving import SingleFlight, RateLimiter, normalize_query
+
+# Сценарий «начало смены»: USERS человек за WINDOW секунд задают несколько популярных вопросов
+# (с разным регистром и пунктуацией), плюс один чат шлёт SPAM сообщений подряд.
+# Поиск заменён нагрузкой на CPU длительностью COST_MS (≈ эмбеддинг + FAISS на нашем корпусе).
+# Сравниваем прямой вызов (как было), только SingleFlight и SingleFlight + RateLimiter из serving.py,
+# чтобы экономия от склейки и от ограничения частоты считалась по отдельности.
+#   python coalesce_scenario.py [USERS] [COST_MS]
+
+USERS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+COST_MS = float(sys.argv[2]) if len(sys.argv) > 2 else 40
+WINDOW = 3.0
+SPAM = 30
+QUESTIONS = ["Чек-лист открытия", "чек-лист открытия?", "Чек лист открытия!", "График работы кофеен",
+             "график работы кофеен", "Дресс-код бариста", "Как принимать товар на филиал"]
+
+def search(q: str):
+    end = time.thread_time() + COST_MS / 1000
+    while time.thread_time() < end:
+        pass
+    return q
+
+def arrivals():
+    rnd = random.Random(7)
+    events = [(rnd.uniform(0, WINDOW), chat, rnd.choice(QUESTIONS)) for chat in range(USERS)]
+    events += [(0.05 * i, "spammer", f"вопрос номер {i}") for i in range(SPAM)]
+    return sorted(events, key=lambda e: e[0])
+
+async def run(coalesce: bool, limit: bool) -> Counter:
+    stats = Counter()
+    flight = SingleFlight(stats)
+    limiter = RateLimiter(stats, rate=12/60, burst=5)
+
+    async def handle(delay, chat, q):
+        await asyncio.sleep(delay)
+        stats["questions"] += 1
+        if limit and limiter.check(chat) != "ok":
+            return
+        if not coalesce:
+            stats["computed"] += 1
+            await asyncio.to_thread(search, q)
+            return
+        await flight.do(normalize_query(q), lambda: asyncio.to_thread(search, q))
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(handle(*e) for e in arrivals()))
+    stats["cpu_ms"] = round((time.process_time() - cpu) * 1000)
+    stats["wall_ms"] = round((time.perf_counter() - wall) * 1000)
+    return stats
+
+def main():
+    print(f"Пользователей: {USERS}, спам: {SPAM} сообщений, окно {WINDOW:.0f} с, стоимость поиска {COST_MS:.0f} мс")
+    base = asyncio.run(run(coalesce=False, limit=False))
+    flight = asyncio.run(run(coalesce=True, limit=False))
+    both = asyncio.run(run(coalesce=True, limit=True))
+    for name, s in (("без склейки", base), ("SingleFlight", flight), ("SingleFlight+лимит", both)):
+        print(f"{name:<20} вопросов {s['questions']:>4}  поисков {s['computed']:>4}  склеено {s['coalesced']:>4}  "
+              f"ограничено {s['throttled']:>4}  CPU {s['cpu_ms']:>6} мс  время {s['wall_ms']:>6} мс")
+    cpu = max(base["cpu_ms"], 1)
+    print(f"Экономия CPU от склейки: {1 - flight['cpu_ms'] / cpu:.0%} "
+          f"({base['computed'] - flight['computed']} поисков)")
+    print(f"Ещё от ограничения частоты: {(flight['cpu_ms'] - both['cpu_ms']) / cpu:.0%} "
+          f"({flight['computed'] - both['computed']} поисков), всего {1 - both['cpu_ms'] / cpu:.0%}")
+
+if __name__ == "__main__":
+    main()
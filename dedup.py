@@ -0,0 +1,150 @@
+import os, re, json, zlib, pathlib
+from collections import Counter
+from typing import Dict, List, Optional
+import numpy as np
+
+# Очистка фрагментов перед эмбеддингом:
+#  1) вырезаем ведущую шапку-таблицу, которая повторяется во всех документах
+#     («группа компаний Beans and Brews / ID Документа / Редакция / Срок действия»);
+#  2) схлопываем почти одинаковые фрагменты (MinHash + LSH по словесным шинглам),
+#     оставляя один канонический и записывая в него источники дублей (aliases).
+
+ROOT = pathlib.Path(__file__).parent
+REPORT_PATH = ROOT/"storage"/"dedup.json"
+
+DEDUP = os.getenv("DEDUP", "1") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))  # оценка сходства Жаккара
+BOILERPLATE_SHARE = 0.3  # строка в ≥30% документов (и хотя бы в 3) — шаблонная
+
+SHINGLE = 5
+NUM_PERM = 64
+BANDS = 16  # 16 полос × 4 строки: кандидаты ловятся примерно от сходства 0.5
+PRIME = np.uint64((1 << 61) - 1)
+
+TABLE_RULE_RE = re.compile(r"^[\s|:-]+$")  # строка-разделитель markdown-таблицы «---|---»
+
+def _norm_line(line: str) -> str:
+    line = re.sub(r"\s+", " ", line).strip().lower()
+    if "|" in line:
+        # строку таблицы сравниваем по первой непустой ячейке: «ID Документа| SOP-1» ~ «ID Документа| OKK»
+        line = next((c.strip() for c in line.split("|") if c.strip()), "")
+    return line
+
+def boilerplate_lines(texts: List[str]) -> set:
+    df = Counter()
+    for t in texts:
+        df.update({n for n in map(_norm_line, t.splitlines()) if n and not TABLE_RULE_RE.match(n)})
+    min_df = max(3, int(len(texts) * BOILERPLATE_SHARE))
+    return {l for l, n in df.items() if n >= min_df}
+
+def strip_boilerplate(text: str, common: set) -> str:
+    """Убирает ведущий блок-таблицу (шапку документа), если он в основном из шаблонных строк.
+    Остальной текст не трогаем: таблицы и подписи внутри документа остаются как есть."""
+    lines = text.splitlines()
+    # ведущая markdown-таблица: подряд идущие строки с «|» (пустые строки внутри допускаются)
+    end = 0
+    while end < len(lines) and ("|" in lines[end] or not lines[end].strip()):
+        end += 1
+    head = [_norm_line(l) for l in lines[:end] if l.strip() and not TABLE_RULE_RE.match(l)]
+    if not head or sum(l in common for l in head) * 2 < len(head):
+        return text.strip()
+    return "\n".join(lines[end:]).strip()
+
+def _shingles(text: str) -> np.ndarray:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < SHINGLE:
+        words = words + [""] * (SHINGLE - len(words))
+    grams = {" ".join(words[i:i+SHINGLE]) for i in range(len(words) - SHINGLE + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64)
+
+_rng = np.random.RandomState(42)
+_A = _rng.randint(1, 1 << 31, NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, NUM_PERM).astype(np.uint64)
+
+def minhash(text: str) -> np.ndarray:
+    h = _shingles(text)
+    # (a*h + b) mod p для всех перестановок сразу; crc32 < 2^32 и a < 2^31 — переполнения нет
+    return ((np.outer(h, _A) + _B) % PRIME).min(axis=0)
+
+def near_duplicates(texts: List[str], threshold: float = DEDUP_THRESHOLD) -> List[int]:
+    """Для каждого фрагмента — индекс канонического (первого встреченного) похожего фрагмента."""
+    sigs = [minhash(t) for t in texts]
+    rows = NUM_PERM // BANDS
+    buckets: Dict[tuple, List[int]] = {}
+    canon = list(range(len(texts)))
+    for i, sig in enumerate(sigs):
+        seen = set()
+        for b in range(BANDS):
+            key = (b, sig[b*rows:(b+1)*rows].tobytes())
+            for j in buckets.get(key, ()):
+                if j in seen:
+                    continue
+                seen.add(j)
+                if np.mean(sigs[j] == sig) >= threshold:
+                    canon[i] = canon[j]
+                    break
+            if canon[i] != i:
+                break
+        if canon[i] == i:
+            for b in range(BANDS):
+                buckets.setdefault((b, sig[b*rows:(b+1)*rows].tobytes()), []).append(i)
+    return canon
+
+def dedup_records(records: List[Dict], report_path: Optional[pathlib.Path] = REPORT_PATH) -> List[Dict]:
+    """Чистит шаблонные шапки и схлопывает дубли. Пишет отчёт в report_path (None — не писать)."""
+    if not DEDUP:
+        if report_path:
+            report_path.unlink(missing_ok=True)
+        return records
+    before_chars = sum(len(r["text"]) for r in records)
+    docs: Dict[str, List[str]] = {}
+    for r in records:
+        docs.setdefault(r.get("url") or r.get("doc_id") or r["text"], []).append(r["text"])
+    common = boilerplate_lines(["\n".join(ts) for ts in docs.values()])
+    cleaned = []
+    for r in records:
+        text = strip_boilerplate(r["text"], common)
+        if text:
+            cleaned.append({**r, "text": text})
+    empty = len(records) - len(cleaned)
+
+    canon = near_duplicates([r["text"] for r in cleaned])
+    out, pos = [], {}
+    for i, r in enumerate(cleaned):
+        c = canon[i]
+        if c == i:
+            pos[i] = len(out)
+            out.append(r)
+            continue
+        keep = out[pos[c]]
+        alias = {k: r[k] for k in ("chunk_id", "title", "url") if k in r}
+        keep.setdefault("aliases", []).append(alias)
+
+    report = {
+        "chunks_before": len(records),
+        "chunks_after": len(out),
+        "boilerplate_lines": len(common),
+        "emptied_by_boilerplate": empty,
+        "near_duplicates": len(cleaned) - len(out),
+        "chars_before": before_chars,
+        "chars_after": sum(len(r["text"]) for r in out),
+        "threshold": DEDUP_THRESHOLD,
+    }
+    if report_path:
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), "utf-8")
+    return out
+
+def describe(report: Dict) -> str:
+    shrink = 1 - report["chars_after"] / max(report["chars_before"], 1)
+    return (f"дедупликация: фрагментов {report['chunks_before']} → {report['chunks_after']} "
+            f"(дублей {report['near_duplicates']}, пустых после чистки шапок {report['emptied_by_boilerplate']}), "
+            f"текста {report['chars_before']} → {report['chars_after']} символов (−{shrink:.0%})")
+
+def embedding_time_saved(embed_seconds: float) -> str:
+    """Оценка сэкономленного времени эмбеддинга: оно растёт примерно линейно от объёма текста."""
+    if not REPORT_PATH.exists():
+        return ""
+    report = json.loads(REPORT_PATH.read_text("utf-8"))
+    removed = report["chars_before"] - report["chars_after"]
+    saved = embed_seconds * removed / max(report["chars_after"], 1)
+    return f"дедупликация сэкономила ≈{saved:.1f} с эмбеддинга ({describe(report)})"
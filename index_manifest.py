@@ -0,0 +1,81 @@
+import json, time, hashlib, pathlib
+from typing import Dict, List, Optional
+
+ROOT = pathlib.Path(__file__).parent
+STORAGE = ROOT/"storage"
+MANIFEST_PATH = STORAGE/"manifest.json"
+# Параметры чанкера, которым реально собран chunks.jsonl (пишется вместе с ним)
+CHUNKER_PATH = STORAGE/"chunker.json"
+
+# Увеличивать при любом несовместимом изменении формата индекса
+FORMAT_VERSION = 1
+
+# Поля, по которым индекс считается «тем же самым» — при их совпадении пересборка не нужна
+BUILD_KEYS = ("model", "query_prefix", "passage_prefix",
+              "normalization", "dtype", "faiss_type", "chunker", "corpus_hash")
+
+def query_prefix_for(model: str) -> str:
+    # Префиксы нужны только для E5
+    return "query: " if "e5" in (model or "").lower() else ""
+
+def file_sha256(path: pathlib.Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def make_manifest(*, model: str, embedder: str, dim: int, rows: int, query_prefix: str, passage_prefix: str,
+                  normalization: str, dtype: str, faiss_type: str, chunker: Dict, corpus_hash: str) -> Dict:
+    return {
+        "format_version": FORMAT_VERSION,
+        "model": model,
+        "embedder": embedder,  # библиотека, которой кодировались фрагменты: fastembed / sentence-transformers
+        "dim": int(dim),
+        "rows": int(rows),
+        "query_prefix": query_prefix,
+        "passage_prefix": passage_prefix,
+        "normalization": normalization,
+        "dtype": dtype,
+        "faiss_type": faiss_type,
+        "chunker": chunker,
+        "corpus_hash": corpus_hash,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+def write_manifest(manifest: Dict, path: pathlib.Path = MANIFEST_PATH):
+    path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), "utf-8")
+
+def read_manifest(path: pathlib.Path = MANIFEST_PATH) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text("utf-8"))
+
+def write_chunker_params(params: Dict, path: pathlib.Path = CHUNKER_PATH):
+    path.write_text(json.dumps(params, ensure_ascii=False, indent=2), "utf-8")
+
+def read_chunker_params(path: pathlib.Path = CHUNKER_PATH) -> Dict:
+    # chunks.jsonl старого формата собран без записи параметров
+    if not path.exists():
+        return {"name": "unknown"}
+    return json.loads(path.read_text("utf-8"))
+
+def check_manifest(manifest: Dict, **expected) -> List[str]:
+    """Сравнивает манифест с ожиданиями потребителя, возвращает список расхождений."""
+    problems = []
+    if manifest.get("format_version") != FORMAT_VERSION:
+        problems.append(f"format_version: индекс {manifest.get('format_version')!r}, ожидается {FORMAT_VERSION}")
+    for key, want in expected.items():
+        have = manifest.get(key)
+        if have != want:
+            problems.append(f"{key}: индекс {have!r}, ожидается {want!r}")
+    return problems
+
+def is_up_to_date(expected: Dict, files: List[pathlib.Path], path: pathlib.Path = MANIFEST_PATH) -> bool:
+    """True, если индекс уже собран с теми же параметрами по тому же корпусу."""
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get("format_version") != FORMAT_VERSION:
+        return False
+    if not all(p.exists() for p in files):
+        return False
+    return all(manifest.get(k) == expected.get(k) for k in BUILD_KEYS)
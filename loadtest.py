@@ -0,0 +1,227 @@
+import os, sys, json, time, random, signal, pathlib, argparse, threading, subprocess
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Нагрузочный тест bot.py без Telegram: поднимаем локальную заглушку Bot API
+# (getMe / deleteWebhook / getUpdates / sendMessage), запускаем бота с TELEGRAM_API_URL на неё
+# и проигрываем вопросы от N пользователей с заданной интенсивностью (пуассоновский поток).
+# Итог: пропускная способность, перцентили задержки ответа, доля ошибок, CPU и RSS процесса бота.
+#   python loadtest.py --questions storage/bench_questions.jsonl --users 50 --rate 5 --messages 300
+#   python loadtest.py --questions storage/queries.jsonl --env RATE_LIMIT_BURST=1000 --out run.json
+# Модель эмбеддингов должна быть уже в локальном кэше fastembed — сеть тесту не нужна.
+
+ROOT = pathlib.Path(__file__).parent
+TOKEN = "123456:LOADTEST"
+ERROR_MARK = "Произошла ошибка"
+THROTTLE_MARK = "Слишком много вопросов"
+DROP_GRACE = 2.0  # с тишины, после которой оставшиеся вопросы считаются отброшенными ограничителем
+
+def load_questions(path: pathlib.Path):
+    """.txt — вопрос на строку; .jsonl — поле "q" (storage/bench_questions.jsonl, журнал QUERY_LOG)."""
+    lines = [l.strip() for l in path.read_text("utf-8").splitlines() if l.strip()]
+    if path.suffix == ".jsonl":
+        return [json.loads(l)["q"] for l in lines]
+    return lines
+
+class FakeTelegram:
+    """Состояние заглушки: очередь входящих апдейтов и учёт ответов бота по message_id вопроса."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.updates = []
+        self.next_update_id = 1
+        self.pending = {}  # message_id -> время отправки вопроса
+        self.prev_in_chat = {}  # message_id -> message_id предыдущего вопроса того же чата
+        self.last_in_chat = {}
+        self.throttled_ids = set()
+        self.latencies, self.replies = [], []
+        self.errors = self.throttled = 0
+        self.last_event = time.perf_counter()
+        self.polled = threading.Event()
+
+    def push(self, chat_id: int, text: str):
+        now = time.time()
+        with self.cond:
+            uid = self.next_update_id
+            self.next_update_id += 1
+            self.updates.append({"update_id": uid, "message": {
+                "message_id": uid, "date": int(now), "text": text,
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}}})
+            self.pending[uid] = self.last_event = time.perf_counter()
+            self.prev_in_chat[uid] = self.last_in_chat.get(chat_id)
+            self.last_in_chat[chat_id] = uid
+            self.cond.notify_all()
+
+    def get_updates(self, offset: int, timeout: float):
+        self.polled.set()
+        deadline = time.time() + timeout
+        with self.cond:
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates and time.time() < deadline:
+                self.cond.wait(deadline - time.time())
+            return list(self.updates)
+
+    def on_reply(self, reply_to: int, text: str):
+        now = time.perf_counter()
+        with self.cond:
+            sent = self.pending.pop(reply_to, None)
+            if sent is None:
+                return  # ответ не на вопрос теста (/stats и т.п.)
+            self.last_event = now
+            if THROTTLE_MARK in text:
+                self.throttled += 1
+                self.throttled_ids.add(reply_to)
+            else:
+                self.latencies.append(now - sent)
+                self.replies.append(now)
+                self.errors += ERROR_MARK in text
+            self.cond.notify_all()
+
+    def dropped(self) -> set:
+        """Вопросы без ответа, отброшенные ограничителем: бот молчит, пока чат не выйдет из «throttle»,
+        то есть предыдущий вопрос этого чата получил предупреждение или сам отброшен. Вызывать под cond."""
+        out = set()
+        for uid in sorted(self.pending):
+            prev = self.prev_in_chat[uid]
+            if prev in self.throttled_ids or prev in out:
+                out.add(uid)
+        return out
+
+def make_handler(tg: FakeTelegram):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+            if "json" in (self.headers.get("Content-Type") or ""):
+                params = json.loads(body or "{}")
+            else:
+                params = {k: v[0] for k, v in parse_qs(body).items()}
+            method = self.path.rsplit("/", 1)[-1]
+            self.reply(self.dispatch(method, params))
+
+        do_GET = do_POST
+
+        def dispatch(self, method: str, p: dict):
+            if method == "getMe":
+                return {"id": 123456, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot"}
+            if method == "getUpdates":
+                return tg.get_updates(int(p.get("offset") or 0), float(p.get("timeout") or 0))
+            if method == "sendMessage":
+                chat_id = int(p["chat_id"])
+                # с QUOTE_REPLIES=1 бот отвечает цитатой: reply_parameters приходит JSON-строкой в полях формы
+                quote = p.get("reply_parameters") or {}
+                if isinstance(quote, str):
+                    quote = json.loads(quote)
+                tg.on_reply(int(quote.get("message_id") or p.get("reply_to_message_id") or 0), p.get("text", ""))
+                return {"message_id": 1, "date": int(time.time()), "text": p.get("text", ""),
+                        "chat": {"id": chat_id, "type": "private"}}
+            return True  # deleteWebhook, setMyCommands и прочее — просто «ок»
+
+        def reply(self, result):
+            data = json.dumps({"ok": True, "result": result}, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+    return Handler
+
+def proc_stats(pid: int):
+    """CPU (с) и RSS/пиковый RSS (МБ) процесса из /proc; на других ОС — None."""
+    try:
+        stat = pathlib.Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+        cpu = (int(stat[11]) + int(stat[12])) / os.sysconf("SC_CLK_TCK")
+        status = dict(l.split(":", 1) for l in pathlib.Path(f"/proc/{pid}/status").read_text().splitlines() if ":" in l)
+        mb = lambda k: int(status[k].split()[0]) / 1024
+        return cpu, mb("VmRSS"), mb("VmHWM")
+    except (OSError, KeyError, IndexError):
+        return None
+
+def percentile(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))] if xs else float("nan")
+
+def main():
+    ap = argparse.ArgumentParser(description="Нагрузочный тест bot.py на локальной заглушке Telegram Bot API")
+    ap.add_argument("--questions", type=pathlib.Path, default=ROOT/"storage"/"bench_questions.jsonl")
+    ap.add_argument("--users", type=int, default=20, help="число симулируемых чатов")
+    ap.add_argument("--rate", type=float, default=2.0, help="сообщений в секунду (суммарно)")
+    ap.add_argument("--messages", type=int, default=100)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--env", action="append", default=[], help="KEY=VALUE для процесса бота")
+    ap.add_argument("--ready-timeout", type=float, default=300, help="ожидание запуска бота, с")
+    ap.add_argument("--drain-timeout", type=float, default=60, help="ожидание ответов после последнего вопроса, с")
+    ap.add_argument("--out", type=pathlib.Path, help="сохранить отчёт в JSON")
+    args = ap.parse_args()
+
+    questions = load_questions(args.questions)
+    rnd = random.Random(args.seed)
+    schedule, t = [], 0.0
+    for _ in range(args.messages):
+        t += rnd.expovariate(args.rate)
+        schedule.append((t, 1000 + rnd.randrange(args.users), rnd.choice(questions)))
+
+    tg = FakeTelegram()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(tg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    env = {**os.environ, "BOT_TOKEN": TOKEN, "TELEGRAM_API_URL": f"http://127.0.0.1:{args.port}", "QUOTE_REPLIES": "1"}
+    env.update(kv.split("=", 1) for kv in args.env)
+    bot = subprocess.Popen([sys.executable, str(ROOT/"bot.py")], env=env, cwd=ROOT)
+    try:
+        ready_by = time.time() + args.ready_timeout
+        while not tg.polled.wait(0.5) and bot.poll() is None and time.time() < ready_by:
+            pass
+        if not tg.polled.is_set() or bot.poll() is not None:
+            raise SystemExit("❌ Бот не начал опрос getUpdates — см. его вывод выше")
+        print(f"Бот готов. Отправляю {args.messages} сообщений от {args.users} пользователей, {args.rate}/с")
+        before = proc_stats(bot.pid)
+        start = time.perf_counter()
+        for at, chat_id, q in schedule:
+            time.sleep(max(0.0, start + at - time.perf_counter()))
+            tg.push(chat_id, q)
+        deadline = time.perf_counter() + args.drain_timeout
+        with tg.cond:
+            # ждём, пока без ответа не останутся только отброшенные ограничителем вопросы
+            # и DROP_GRACE с не пришло ни одного ответа (вопрос после паузы мог пройти лимит)
+            while tg.pending and time.perf_counter() < deadline:
+                if len(tg.dropped()) == len(tg.pending) and time.perf_counter() - tg.last_event >= DROP_GRACE:
+                    break
+                tg.cond.wait(0.2)
+            dropped = len(tg.dropped())
+            lost = len(tg.pending) - dropped
+        end = max(tg.replies) if tg.replies else time.perf_counter()
+        after = proc_stats(bot.pid)
+    finally:
+        bot.send_signal(signal.SIGINT)
+        try:
+            bot.wait(15)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        server.shutdown()
+
+    lat = [x * 1000 for x in tg.latencies]
+    report = {
+        "messages": args.messages, "users": args.users, "rate": args.rate, "seed": args.seed, "env": args.env,
+        # replied и задержки — без предупреждений ограничителя; dropped — отброшенные им молча,
+        # unanswered — прочие вопросы без ответа к концу ожидания
+        "replied": len(lat), "throttled": tg.throttled, "dropped": dropped, "unanswered": lost, "errors": tg.errors,
+        "error_rate": round(tg.errors / args.messages, 4),
+        "throughput_rps": round(len(lat) / max(end - start, 1e-9), 2),
+        "latency_ms": {f"p{p}": round(percentile(lat, p), 1) for p in (50, 90, 95, 99)} | {"max": round(max(lat, default=float("nan")), 1)},
+    }
+    if before and after:
+        report["cpu_s"] = round(after[0] - before[0], 2)
+        report["cpu_util"] = round((after[0] - before[0]) / max(end - start, 1e-9), 2)
+        report["rss_mb"], report["peak_rss_mb"] = round(after[1], 1), round(after[2], 1)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.out:
+        args.out.write_text(json.dumps(report, ensure_ascii=False, indent=2), "utf-8")
+
+if __name__ == "__main__":
+    main()
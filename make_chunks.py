@@ -1,13 +1,16 @@
-import json, re, textwrap
+import os, json, re
 from pathlib import Path
+from text_utils import chunk_markdown
+from index_manifest import write_chunker_params
+from dedup import dedup_records, describe, DEDUP, REPORT_PATH
 
 ROOT = Path(__file__).parent
 RAW = ROOT/"storage/raw_docs.jsonl"      
 OUT = ROOT/"storage/chunks.jsonl"        
 
 
-MAX_CHARS = 1200
-MIN_CHARS = 300
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE_CHARS", "1200"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP_CHARS", "200"))
 
 def clean(t: str) -> str:
     t = t.replace("\u200b","").replace("\xa0"," ")
@@ -15,28 +18,6 @@ def clean(t: str) -> str:
     t = re.sub(r"\n{3,}", "\n\n", t)
     return t.strip()
 
-def split_into_chunks(text: str):
-    paras = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
-    buf, cur = [], 0
-    for p in paras:
-        if not buf:
-            buf = [p]; cur = len(p)
-            continue
-        if cur + 1 + len(p) <= MAX_CHARS:
-            buf.append(p); cur += 1 + len(p)
-        else:
-            chunk = clean("\n\n".join(buf))
-            if len(chunk) >= MIN_CHARS:
-                yield chunk
-            else:
-                
-                buf.append(p); cur += 1 + len(p)
-                chunk = clean("\n\n".join(buf))
-                yield chunk
-            buf, cur = [], 0
-    if buf:
-        yield clean("\n\n".join(buf))
-
 def main():
     if not RAW.exists():
         raise SystemExit("Нет storage/raw_docs.jsonl — сначала запустите краулер ingest_gdrive.py")
@@ -52,10 +33,14 @@ def main():
         title= doc.get("title") or "Документ"
         if not text.strip():
             continue
-        for ch in split_into_chunks(text):
-            out.append({"text": ch, "url": url, "title": title})
+        for ch in chunk_markdown(clean(text), CHUNK_SIZE, CHUNK_OVERLAP):
+            out.append({"text": ch["text"], "section": ch["section"], "url": url, "title": title})
+    out = dedup_records(out)
+    if DEDUP:
+        print(describe(json.loads(REPORT_PATH.read_text("utf-8"))))
     OUT.parent.mkdir(parents=True, exist_ok=True)
     OUT.write_text("\n".join(json.dumps(x, ensure_ascii=False) for x in out), "utf-8")
+    write_chunker_params({"name": "markdown", "size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP})
     print(f"Готово: чанков {len(out)} → {OUT}")
 
 if __name__ == "__main__":
@@ -1,7 +1,11 @@
-import os, json, pathlib, pickle, numpy as np
+import os, sys, json, time, pathlib, pickle, numpy as np
 from dotenv import load_dotenv
 import faiss
 from fastembed import TextEmbedding
+from dedup import embedding_time_saved
+from vector_store import EMBED_DTYPE, build_faiss_index, faiss_type_for
+from term_index import TermIndex
+from index_manifest import make_manifest, write_manifest, is_up_to_date, file_sha256, query_prefix_for, read_chunker_params
 
 load_dotenv()
 ROOT = pathlib.Path(__file__).parent
@@ -18,24 +22,46 @@ def main():
     if not CHUNKS.exists():
         raise SystemExit("Нет storage/chunks.jsonl — сначала запустите make_chunks.py")
 
+    build = {
+        "model": MODEL_NAME,
+        "embedder": "fastembed",
+        "query_prefix": query_prefix_for(MODEL_NAME),
+        "passage_prefix": "",
+        "normalization": "l2",
+        "dtype": EMBED_DTYPE,
+        "faiss_type": faiss_type_for(EMBED_DTYPE),
+        "chunker": read_chunker_params(),
+        "corpus_hash": file_sha256(CHUNKS),
+    }
+    if "--force" not in sys.argv and is_up_to_date(build, [STORAGE/"embeddings.npy", STORAGE/"index.faiss"]):
+        print("Индекс актуален (manifest.json совпадает) — пересборка не нужна. Для принудительной: --force")
+        return
+
     recs = [json.loads(l) for l in CHUNKS.read_text("utf-8").splitlines()]
     texts = [" ".join(r["text"].split()) for r in recs]
 
     print(f"Фрагментов для кодирования: {len(texts)}")
     embedder = TextEmbedding(model_name=MODEL_NAME)
+    t0 = time.perf_counter()
     vecs = list(embedder.embed(texts, batch_size=64))
+    saved = embedding_time_saved(time.perf_counter() - t0)
+    if saved:
+        print(saved)
     X = l2_normalize(np.vstack(vecs))
 
-    index = faiss.IndexFlatIP(X.shape[1])
-    index.add(X)
+    index = build_faiss_index(X)
 
+    # embeddings.npy всегда float32: источник для точного пересчёта топ-кандидатов
     np.save(STORAGE/"embeddings.npy", X)
     faiss.write_index(index, str(STORAGE/"index.faiss"))
 
     with open(STORAGE/"bm25.pkl", "wb") as f:
         pickle.dump(texts, f)
 
-    print("✅ Индекс готов: embeddings.npy, index.faiss, bm25.pkl сохранены в storage/")
+    TermIndex.build([r["text"] + " " + r.get("title", "") for r in recs], build["corpus_hash"]).save()
+    write_manifest(make_manifest(dim=X.shape[1], rows=X.shape[0], **build))
+
+    print("✅ Индекс готов: embeddings.npy, index.faiss, bm25.pkl, manifest.json сохранены в storage/")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,59 @@
+import json, time, pathlib, numpy as np
+from dotenv import load_dotenv
+import faiss
+from vector_store import build_faiss_index, rescore
+from index_manifest import read_manifest, query_prefix_for
+from tune_chunks import make_encoder
+
+# Отчёт: сколько памяти/диска экономит квантование и насколько меняется полнота
+# на контрольных вопросах (storage/bench_questions.jsonl) относительно float32.
+
+load_dotenv()
+ROOT = pathlib.Path(__file__).parent
+STORAGE = ROOT/"storage"
+CHUNKS = STORAGE/"chunks.jsonl"
+BENCH = STORAGE/"bench_questions.jsonl"
+
+TOP_K = 5
+CANDIDATES = 15  # столько же кандидатов берёт bot.best_hit
+
+def embed_questions(manifest: dict, questions):
+    """Вопросы кодируются той же библиотекой, моделью и префиксом, что записаны в manifest.json."""
+    model, encode, _ = make_encoder(manifest)
+    prefix = manifest.get("query_prefix", query_prefix_for(model))
+    V = np.asarray(encode([prefix + q for q in questions]), dtype="float32")
+    return model, (V / (np.linalg.norm(V, axis=1, keepdims=True) + 1e-12)).astype("float32")
+
+def main():
+    manifest = read_manifest() or {}
+    X = np.load(STORAGE/"embeddings.npy").astype("float32")
+    urls = [json.loads(l).get("url", "") for l in CHUNKS.read_text("utf-8").splitlines()]
+    bench = [json.loads(l) for l in BENCH.read_text("utf-8").splitlines() if l.strip()]
+    model, V = embed_questions(manifest, [b["q"] for b in bench])
+
+    ref = build_faiss_index(X, "float32")
+    _, ref_I = ref.search(V, TOP_K)
+
+    print(f"Модель: {model} ({manifest.get('embedder', 'fastembed')}), векторов: {X.shape[0]}×{X.shape[1]}, вопросов: {len(bench)}")
+    print(f"{'формат':<8} {'размер':>10} {'сжатие':>7} {'поиск,мс':>9} {'recall@5':>9} {'+пересчёт':>10} {'док@1':>6} {'док@1+п':>8}")
+    base_size = None
+    for dtype in ("float32", "float16", "int8"):
+        index = build_faiss_index(X, dtype)
+        size = faiss.serialize_index(index).nbytes
+        base_size = base_size or size
+        t0 = time.perf_counter()
+        D, I = index.search(V, CANDIDATES)
+        search_ms = (time.perf_counter() - t0) * 1000 / len(bench)
+
+        raw_top, resc_top = [], []
+        for qi in range(len(bench)):
+            raw_top.append(I[qi, :TOP_K])
+            ids, _ = rescore(X, V[qi], I[qi])
+            resc_top.append(ids[:TOP_K])
+        recall = lambda tops: np.mean([len(set(t) & set(ref_I[qi])) / TOP_K for qi, t in enumerate(tops)])
+        doc_hit = lambda tops: np.mean([urls[t[0]] == b["url"] for t, b in zip(tops, bench) if len(t)])
+        print(f"{dtype:<8} {size/1024:>8.1f}КБ {base_size/size:>6.1f}x {search_ms:>9.3f} "
+              f"{recall(raw_top):>9.3f} {recall(resc_top):>10.3f} {doc_hit(raw_top):>6.2f} {doc_hit(resc_top):>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import re, time, asyncio
+from collections import Counter
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+# Обслуживание вопросов под нагрузкой: одинаковые вопросы «в полёте» считаются один раз,
+# а каждому чату выдаётся ограниченный поток запросов (token bucket).
+
+def normalize_query(q: str) -> str:
+    return " ".join(re.findall(r"\w+", q.lower().replace("ё", "е")))
+
+class SingleFlight:
+    """Одновременные вызовы с одинаковым ключом ждут одно и то же вычисление."""
+
+    def __init__(self, stats: Counter):
+        self.stats = stats
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        fut = self._inflight.get(key)
+        if fut is None:
+            self.stats["computed"] += 1
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+        # shield: отмена одного ожидающего не отменяет вычисление для остальных
+        return await asyncio.shield(fut)
+
+class RateLimiter:
+    """Token bucket на ключ: burst запросов сразу, дальше rate запросов в секунду."""
+
+    def __init__(self, stats: Counter, rate: float, burst: int):
+        self.stats = stats
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[Hashable, Tuple[float, float]] = {}
+        self._warned = set()
+
+    def check(self, key: Hashable) -> str:
+        """'ok' — пропустить; 'throttle' — отказ, предупредить; 'drop' — отказ, уже предупреждали."""
+        now = time.monotonic()
+        tokens, last = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            self._warned.discard(key)
+            return "ok"
+        self._buckets[key] = (tokens, now)
+        self.stats["throttled"] += 1
+        if key in self._warned:
+            return "drop"
+        self._warned.add(key)
+        return "throttle"
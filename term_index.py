@@ -0,0 +1,132 @@
+import re, math, pickle, pathlib
+from typing import Dict, Iterable, List
+import numpy as np
+
+# Триграммный индекс по словарю корпуса: опечатки и словоформы запроса
+# («жироулавителей», «жироуловитель») разворачиваются в реальные слова из фрагментов.
+
+ROOT = pathlib.Path(__file__).parent
+TERMS_PATH = ROOT/"storage"/"terms.pkl"
+
+MIN_LEN = 3
+MIN_SIM = 0.55  # коэффициент Дайса по триграммам
+MAX_EXPANSIONS = 5
+MIN_LEN_RATIO = 0.75  # расширение заметно короче слова запроса («час» для «часто») — не берём
+MIN_STEM = 5  # по короткой основе словоформы не ищем: «част» общая у «часто» и «часть»
+SKIP_LONGEST = 2  # столько самых длинных списков триграмм expand проверяет поиском, а не подсчётом
+SHORT_LEN = 6  # короткие слова: похожие только для слов из корпуса и не дальше одной правки
+
+# Служебные и вопросительные слова не разворачиваем и в ключевые слова не берём
+STOP_WORDS = frozenset("""как что где когда кто чем чего зачем почему какой какая какое какие сколько
+это этот эта эти для или при если так все всё уже еще ещё нет можно нужно надо чтобы его она они
+мне нам вам нас вас там тут без над под про""".replace("ё", "е").split())
+
+WORD_RE = re.compile(r"\w+")
+
+# Лёгкий стеммер: отрезаем одно типичное окончание, если остаётся основа ≥ 4 букв
+_ENDINGS = sorted("""иями ями ами ией иях ого его ому ему ыми ими ой ей ий ый ая яя ое ее ые ие ов ев
+ах ях ам ям ом ем ую юю ть ся а я о е ы и у ю ь й""".split(), key=len, reverse=True)
+
+def stem(word: str) -> str:
+    for end in _ENDINGS:
+        if word.endswith(end) and len(word) - len(end) >= 4:
+            return word[:-len(end)]
+    return word
+
+def tokens(text: str) -> List[str]:
+    return [w for w in WORD_RE.findall(text.lower().replace("ё", "е")) if len(w) >= MIN_LEN]
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Расстояние Левенштейна между a и b не больше 1."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + (len(a) == len(b)):] == b[i + 1:]
+
+def trigrams(word: str) -> List[str]:
+    w = f"  {word} "
+    return list({w[i:i+3] for i in range(len(w) - 2)})
+
+class TermIndex:
+    def __init__(self, vocab: List[str], gram_count: np.ndarray, postings: Dict[str, np.ndarray],
+                 by_stem: Dict[str, List[int]], corpus_hash: str = ""):
+        self.vocab = vocab
+        self.term_id = {t: i for i, t in enumerate(vocab)}
+        self.gram_count = gram_count
+        self.postings = postings
+        self.by_stem = by_stem
+        self.corpus_hash = corpus_hash
+
+    @classmethod
+    def build(cls, texts: Iterable[str], corpus_hash: str = "") -> "TermIndex":
+        vocab = sorted({t for text in texts for t in tokens(text)})
+        grams: Dict[str, List[int]] = {}
+        by_stem: Dict[str, List[int]] = {}
+        gram_count = np.empty(len(vocab), dtype=np.int32)
+        for i, t in enumerate(vocab):
+            g = trigrams(t)
+            gram_count[i] = len(g)
+            for x in g:
+                grams.setdefault(x, []).append(i)
+            by_stem.setdefault(stem(t), []).append(i)
+        postings = {g: np.asarray(ids, dtype=np.int32) for g, ids in grams.items()}
+        return cls(vocab, gram_count, postings, by_stem, corpus_hash)
+
+    def save(self, path: pathlib.Path = TERMS_PATH):
+        with open(path, "wb") as f:
+            pickle.dump({"vocab": self.vocab, "gram_count": self.gram_count, "postings": self.postings,
+                         "by_stem": self.by_stem, "corpus_hash": self.corpus_hash}, f)
+
+    @classmethod
+    def load(cls, path: pathlib.Path = TERMS_PATH) -> "TermIndex":
+        with open(path, "rb") as f:
+            return cls(**pickle.load(f))
+
+    def expand(self, token: str, limit: int = MAX_EXPANSIONS, min_sim: float = MIN_SIM) -> List[str]:
+        """Слова корпуса, похожие на token: само слово, его словоформы и близкие по триграммам."""
+        token = token.lower().replace("ё", "е")
+        if token in STOP_WORDS:
+            return [token]
+        known = token in self.term_id
+        short = len(token) <= SHORT_LEN
+        min_len = MIN_LEN_RATIO * len(token)
+        out = [token] if known else []
+        base = stem(token)
+        if len(base) >= MIN_STEM:
+            out += [self.vocab[i] for i in self.by_stem.get(base, ())
+                    if self.vocab[i] != token and len(self.vocab[i]) >= min_len]
+        if short and not known:
+            # у короткого слова одна правка легко даёт другое слово («часто» → «части») — не угадываем
+            return out[:limit] if out else [token]
+        if len(out) >= limit:
+            return out[:limit]  # словоформ хватает — похожие по триграммам всё равно не попали бы в ответ
+        grams = trigrams(token)
+        lists = sorted((self.postings[x] for x in grams if x in self.postings), key=len)
+        if lists:
+            # Дайс ≥ min_sim требует хотя бы need общих триграмм (|t| ≥ min_len). Самые длинные списки
+            # (ведущая «  п» — десятки тысяч слов) в bincount не берём: кандидату хватает need - k общих
+            # триграмм в остальных, а вхождение в отложенные проверяем поиском в отсортированном списке
+            need = math.ceil(min_sim * (len(grams) + min_len) / 2 - 1e-9)
+            k = max(0, min(SKIP_LONGEST, need - 1, len(lists) - 1))
+            counts = np.bincount(np.concatenate(lists[:len(lists) - k]), minlength=len(self.vocab))
+            ids = np.flatnonzero(counts >= need - k)
+            common = counts[ids]
+            for post in lists[len(lists) - k:]:
+                pos = np.minimum(np.searchsorted(post, ids), len(post) - 1)
+                common = common + (post[pos] == ids)
+            keep = common >= need
+            ids, common = ids[keep], common[keep]
+            sim = 2.0 * common / (len(grams) + self.gram_count[ids])
+            keep = sim >= min_sim
+            ids, sim = ids[keep], sim[keep]
+            for i in ids[np.argsort(-sim, kind="stable")]:
+                t = self.vocab[i]
+                if len(out) >= limit:
+                    break
+                if t not in out and len(t) >= min_len and (not short or within_one_edit(token, t)):
+                    out.append(t)
+        return out[:limit] if out else [token]
@@ -0,0 +1,24 @@
+from term_index import TermIndex, within_one_edit
+
+VOCAB_TEXT = """часть части частей копия копии свет света светлой какой какие какое
+пароли паролей чек чека чеке чеку листьях жироуловитель жироуловителя"""
+
+def make_index():
+    return TermIndex.build([VOCAB_TEXT])
+
+def test_short_words_do_not_expand_to_unrelated():
+    ti = make_index()
+    assert ti.expand("часто") == ["часто"]
+    assert ti.expand("копить") == ["копить"]
+    assert ti.expand("как") == ["как"]
+    assert "светлой" not in ti.expand("свет")
+
+def test_word_forms_and_typos_still_expand():
+    ti = make_index()
+    assert set(ti.expand("пароль")) == {"пароли", "паролей"}
+    assert {"чека", "чеке", "чеку"} <= set(ti.expand("чек"))
+    assert "жироуловителя" in ti.expand("жироулавителя")
+
+def test_within_one_edit():
+    assert within_one_edit("свет", "света") and within_one_edit("чека", "чеку")
+    assert not within_one_edit("копить", "копии")
@@ -0,0 +1,18 @@
+from text_utils import chunk_markdown
+
+def test_short_section_merged_without_splitting_next():
+    # короткий раздел A доклеивается к B; B помещается в фрагмент целиком и не режется повторно
+    text = "# Doc\n\n## A\n\n" + "а" * 100 + "\n\n## B\n\n" + "б" * 300 + "\n\n" + "в" * 300
+    chunks = chunk_markdown(text, size=1200, overlap=200)
+    assert len(chunks) == 1
+    assert chunks[0]["section"] == ["Doc"]
+    assert "а" * 100 in chunks[0]["text"] and "в" * 300 in chunks[0]["text"]
+
+def test_header_table_does_not_empty_section():
+    text = "| Шапка | x |\n|---|---|\n| a | b |\n\n# Положение\n\n## 1. Общие положения\n\n" + "текст " * 20
+    chunks = chunk_markdown(text, size=1200, overlap=200)
+    assert chunks[0]["section"] == ["Положение", "1. Общие положения"]
+
+def test_trailing_heading_kept():
+    chunks = chunk_markdown("# Doc\n\nтекст\n\n## Приложение", size=1200, overlap=0)
+    assert "Приложение" in chunks[-1]["text"]
@@ -1,22 +1,122 @@
 import re
+from typing import Dict, List, Tuple
 
-def split_into_chunks(text: str, size: int = 1200, overlap: int = 200):
-    paras = re.split(r"\n\s*\n", text)
-    chunks, buf = [], ""
-    for p in paras:
-        if len(buf) + len(p) + 2 <= size:
-            buf = (buf + "\n\n" + p).strip()
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+LIST_RE = re.compile(r"^\s*(?:[*+•-]|\\-|\d+\\?\.)\s+")
+
+def _kind(p: str) -> str:
+    lines = [l for l in p.splitlines() if l.strip()]
+    if all("|" in l for l in lines):
+        return "table"
+    if LIST_RE.match(lines[0]):
+        return "list"
+    return "text"
+
+def parse_blocks(text: str) -> List[Tuple[Tuple[str, ...], str]]:
+    """Markdown → [(путь разделов, блок)]. Таблица и подряд идущие пункты списка — один блок."""
+    path: List[Tuple[int, str]] = []
+    blocks: List[Tuple[Tuple[str, ...], str, str]] = []
+    heading = ""
+    for p in re.split(r"\n\s*\n", text):
+        if not p.strip():
+            continue
+        m = HEADING_RE.match(p.strip())
+        if m and "\n" not in p.strip():
+            level = len(m.group(1))
+            title = m.group(2).replace("\\", "")
+            path = [(l, t) for l, t in path if l < level] + [(level, title)]
+            heading = (heading + "\n" + title).strip()  # заголовок остаётся в тексте первого блока раздела
+            continue
+        sec = tuple(t for _, t in path)
+        kind = _kind(p)
+        if blocks and not heading and kind != "text" and blocks[-1][0] == sec and blocks[-1][2] == kind:
+            blocks[-1] = (sec, blocks[-1][1] + "\n" + p.strip("\n"), kind)
         else:
+            blocks.append((sec, (heading + "\n\n" + p.strip("\n")).strip("\n"), kind))
+        heading = ""
+    if heading:
+        # заголовок в конце документа без текста под ним — отдельным блоком, чтобы не потерять
+        blocks.append((tuple(t for _, t in path), heading, "text"))
+    return [(sec, b) for sec, b, _ in blocks]
+
+def _split_long(block: str, size: int) -> List[str]:
+    # Длинный блок режем по строкам, затем по предложениям, затем по словам — но не посреди слова
+    for sep in ("\n", r"(?<=[.!?…])\s+", r"\s+"):
+        parts = [x for x in re.split(sep, block) if x.strip()]
+        if len(parts) > 1:
+            break
+    else:
+        return [block[i:i+size] for i in range(0, len(block), size)]
+    out, buf = [], ""
+    for part in parts:
+        if len(part) > size:
             if buf:
-                chunks.append(buf)
-                tail = buf[-overlap:]
-                buf = (tail + "\n\n" + p).strip()
-            else:
-                chunks.append(p[:size])
-                buf = p[size-overlap:]
+                out.append(buf)
+                buf = ""
+            out.extend(_split_long(part, size))
+        elif buf and len(buf) + 1 + len(part) > size:
+            out.append(buf)
+            buf = part
+        else:
+            buf = (buf + ("\n" if sep == "\n" else " ") + part) if buf else part
     if buf:
-        chunks.append(buf)
-    return [c.strip() for c in chunks if c.strip()]
+        out.append(buf)
+    return out
+
+def _common_section(secs) -> Tuple[str, ...]:
+    # общий родитель разделов фрагмента; блоки до первого заголовка (шапка документа) не сужают путь
+    secs = [s for s in secs if s]
+    if not secs:
+        return ()
+    n = 0
+    while n < min(map(len, secs)) and all(s[n] == secs[0][n] for s in secs):
+        n += 1
+    return secs[0][:n]
+
+def chunk_markdown(text: str, size: int = 1200, overlap: int = 200) -> List[Dict]:
+    """Разбивает markdown по иерархии заголовков: фрагмент не пересекает границу раздела
+    (короткие разделы склеиваются с соседним), таблицы и списки не разрываются, если помещаются
+    в size, перекрытие — целыми блоками. У каждого фрагмента — путь разделов section."""
+    chunks: List[Dict] = []
+    buf: List[Tuple[Tuple[str, ...], str]] = []  # (раздел блока, текст)
+    fresh = 0  # сколько блоков в buf добавлено после перекрытия
+
+    def used() -> int:
+        return sum(len(b) + 2 for _, b in buf)
+
+    def flush(keep_overlap: bool):
+        nonlocal buf, fresh
+        if fresh:
+            chunks.append({"text": "\n\n".join(b for _, b in buf).strip(),
+                           "section": list(_common_section(s for s, _ in buf))})
+        tail: List[Tuple[Tuple[str, ...], str]] = []
+        if keep_overlap and overlap > 0:
+            for item in reversed(buf[1:]):
+                if sum(len(b) + 2 for _, b in tail) + len(item[1]) > overlap:
+                    break
+                tail.insert(0, item)
+        buf, fresh = tail, 0
+
+    for sec, block in parse_blocks(text):
+        # граница — только когда меняется раздел самого блока, а не показываемый общий путь
+        if buf and sec != buf[-1][0]:
+            if not fresh:
+                buf = []  # перекрытие не переносим в другой раздел
+            elif used() >= size // 4:
+                flush(keep_overlap=False)
+            # иначе короткий раздел доклеивается к следующему
+        for piece in ([block] if len(block) <= size else _split_long(block, size)):
+            if fresh and used() + len(piece) > size:
+                flush(keep_overlap=True)
+                while buf and used() + len(piece) > size:
+                    buf.pop(0)
+            buf.append((sec, piece))
+            fresh += 1
+    flush(keep_overlap=False)
+    return [c for c in chunks if c["text"]]
+
+def split_into_chunks(text: str, size: int = 1200, overlap: int = 200):
+    return [c["text"] for c in chunk_markdown(text, size, overlap)]
 
 def best_snippet(text: str, query: str, window: int = 400) -> str:
     words = [w for w in re.findall(r"\w+", query.lower()) if len(w) > 2]
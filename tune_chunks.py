@@ -0,0 +1,112 @@
+import os, sys, json, time, pathlib, numpy as np
+from dotenv import load_dotenv
+import faiss
+from fastembed import TextEmbedding
+from text_utils import chunk_markdown
+from dedup import dedup_records
+from vector_store import EMBED_DTYPE, build_faiss_index
+from index_manifest import read_manifest, query_prefix_for
+import make_chunks
+
+# Перебор размеров фрагмента и перекрытия: для каждой пары — число фрагментов, размер индекса,
+# время эмбеддинга (по объёму текста) и полнота на storage/bench_questions.jsonl. В конце — самый маленький индекс,
+# чья полнота не хуже лучшей больше чем на TOLERANCE.
+#   python tune_chunks.py                      # сетка по умолчанию
+#   python tune_chunks.py 600,900,1200 0,150   # свои размеры и перекрытия
+
+load_dotenv()
+ROOT = pathlib.Path(__file__).parent
+STORAGE = ROOT/"storage"
+BENCH = STORAGE/"bench_questions.jsonl"
+
+SIZES = [400, 600, 800, 1200, 1600]
+OVERLAPS = [0, 100, 200]
+TOP_K = 5
+TOLERANCE = 0.02
+
+def load_docs():
+    """Исходные документы: storage/raw_docs.jsonl (ingest_gdrive.py) или meta.json + *.md (ingest_any_gdrive.py)."""
+    if make_chunks.RAW.exists():
+        docs = [json.loads(l) for l in make_chunks.RAW.read_text("utf-8").splitlines() if l.strip()]
+        return [{"text": make_chunks.clean(d.get("text") or ""), "title": d.get("title") or "Документ",
+                 "url": d.get("url") or d.get("source") or ""} for d in docs if (d.get("text") or "").strip()]
+    meta_path = STORAGE/"meta.json"
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text("utf-8"))
+        return [{"text": pathlib.Path(m["path"]).read_text("utf-8"), "title": m["title"], "url": m["url"]}
+                for m in meta.values()]
+    raise SystemExit("Нет исходных документов: запустите ingest_gdrive.py или ingest_any_gdrive.py")
+
+def make_encoder(manifest):
+    """Кодировщик как в продакшене: та же библиотека, модель и префиксы, что записаны в manifest.json."""
+    model = manifest.get("model") or os.getenv("EMBED_MODEL", "sentence-transformers/paraphrase-multilingual-mpnet-base-v2")
+    if manifest.get("embedder") == "sentence-transformers":
+        from sentence_transformers import SentenceTransformer
+        st = SentenceTransformer(model)
+        encode = lambda texts: st.encode(texts, batch_size=32, normalize_embeddings=True)
+        prep = lambda t: t  # build_index.py кодирует текст как есть
+    else:
+        fe = TextEmbedding(model_name=model)
+        encode = lambda texts: np.vstack([np.asarray(v, dtype="float32") for v in fe.embed(texts, batch_size=64)])
+        prep = lambda t: " ".join(t.split())  # как make_index.py
+    return model, encode, prep
+
+def main():
+    sizes = [int(x) for x in sys.argv[1].split(",")] if len(sys.argv) > 1 else SIZES
+    overlaps = [int(x) for x in sys.argv[2].split(",")] if len(sys.argv) > 2 else OVERLAPS
+    manifest = read_manifest() or {}
+    model, encode, prep = make_encoder(manifest)
+    query_prefix = manifest.get("query_prefix", query_prefix_for(model))
+    passage_prefix = manifest.get("passage_prefix", "")
+    docs = load_docs()
+    bench = [json.loads(l) for l in BENCH.read_text("utf-8").splitlines() if l.strip()]
+    Q = np.asarray(encode([query_prefix + b["q"] for b in bench]), dtype="float32")
+    Q /= np.linalg.norm(Q, axis=1, keepdims=True) + 1e-12
+
+    cache = {}  # одинаковые фрагменты в разных конфигурациях не кодируем повторно
+    spent, encoded_chars = 0.0, 0
+    rows = []
+    print(f"Модель: {model} ({manifest.get('embedder', 'fastembed')}), префиксы {query_prefix!r}/{passage_prefix!r}, "
+          f"документов: {len(docs)}, вопросов: {len(bench)}, формат индекса: {EMBED_DTYPE}")
+    for size in sizes:
+        for overlap in overlaps:
+            if overlap >= size:
+                continue
+            recs = [{"text": ch["text"], "url": d["url"], "title": d["title"]}
+                    for d in docs for ch in chunk_markdown(d["text"], size, overlap)]
+            recs = dedup_records(recs, report_path=None)
+            texts = [passage_prefix + prep(r["text"]) for r in recs]
+            todo = [t for t in dict.fromkeys(texts) if t not in cache]
+            if todo:
+                t0 = time.perf_counter()
+                for t, v in zip(todo, encode(todo)):
+                    cache[t] = np.asarray(v, dtype="float32")
+                spent += time.perf_counter() - t0
+                encoded_chars += sum(len(t) for t in todo)
+            X = np.vstack([cache[t] for t in texts])
+            X /= np.linalg.norm(X, axis=1, keepdims=True) + 1e-12
+            index = build_faiss_index(X)
+            _, I = index.search(Q, TOP_K)
+            # документ найден, если совпадает url фрагмента или одного из его дублей
+            urls = [{r["url"]} | {a.get("url") for a in r.get("aliases", [])} for r in recs]
+            hit1 = np.mean([b["url"] in urls[I[qi, 0]] for qi, b in enumerate(bench)])
+            hitk = np.mean([any(b["url"] in urls[i] for i in I[qi] if i >= 0) for qi, b in enumerate(bench)])
+            kb = faiss.serialize_index(index).nbytes / 1024
+            rows.append((size, overlap, len(recs), kb, sum(len(t) for t in texts), hit1, hitk))
+            print(f"  size={size} overlap={overlap}: {len(recs)} фрагментов", flush=True)
+
+    # время эмбеддинга считаем по объёму текста с общей для всех конфигураций скоростью —
+    # иначе кэш делает столбец несравнимым между строками
+    sec_per_char = spent / max(encoded_chars, 1)
+    print(f"\n{'size':>5} {'overlap':>7} {'фрагм.':>7} {'индекс,КБ':>10} {'эмб.,с':>7} {'док@1':>6} {f'док@{TOP_K}':>6}")
+    for size, overlap, n, kb, chars, hit1, hitk in rows:
+        print(f"{size:>5} {overlap:>7} {n:>7} {kb:>10.1f} {chars * sec_per_char:>7.2f} {hit1:>6.2f} {hitk:>6.2f}")
+
+    best = max(r[6] for r in rows)
+    ok = [r for r in rows if r[6] >= best - TOLERANCE]
+    size, overlap, n, kb, _, _, hitk = min(ok, key=lambda r: (r[3], -r[6]))
+    print(f"\nРекомендация: CHUNK_SIZE_CHARS={size} CHUNK_OVERLAP_CHARS={overlap} "
+          f"({n} фрагментов, {kb:.1f} КБ, док@{TOP_K}={hitk:.2f}; лучший док@{TOP_K}={best:.2f})")
+
+if __name__ == "__main__":
+    main()
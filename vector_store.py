@@ -0,0 +1,41 @@
+import os
+import numpy as np
+import faiss
+
+# Формат хранения векторов в index.faiss: float32 (плоский), float16 или int8 (скалярное квантование)
+EMBED_DTYPE = os.getenv("EMBED_DTYPE", "float32")
+
+SQ_TYPES = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    # 8 бит на координату, min/max (т.е. масштаб) обучается отдельно для каждого измерения
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+def build_faiss_index(X: np.ndarray, dtype: str = EMBED_DTYPE):
+    """Строит индекс по нормированным float32-векторам в нужном формате хранения."""
+    X = np.ascontiguousarray(X, dtype="float32")
+    if dtype == "float32":
+        index = faiss.IndexFlatIP(X.shape[1])
+    elif dtype in SQ_TYPES:
+        index = faiss.IndexScalarQuantizer(X.shape[1], SQ_TYPES[dtype], faiss.METRIC_INNER_PRODUCT)
+        index.train(X)
+    else:
+        raise ValueError(f"Неизвестный EMBED_DTYPE={dtype!r}, допустимо: float32, float16, int8")
+    index.add(X)
+    return index
+
+def faiss_type_for(dtype: str) -> str:
+    return "IndexFlatIP" if dtype == "float32" else "IndexScalarQuantizer"
+
+def load_embeddings(path):
+    # mmap: в память попадают только строки, которые реально читаются при пересчёте
+    return np.load(path, mmap_mode="r")
+
+def rescore(X: np.ndarray, v: np.ndarray, ids: np.ndarray):
+    """Точные float32-сходства для кандидатов из квантованного индекса, по убыванию."""
+    ids = np.sort(ids[ids >= 0])  # по возрастанию — последовательное чтение из mmap
+    if ids.size == 0:
+        return ids, np.empty(0, dtype="float32")
+    sims = np.asarray(X[ids], dtype="float32") @ v.reshape(-1)
+    order = np.argsort(-sims)
+    return ids[order], sims[order]